@@ -286,13 +286,14 @@ async def download_file(client: TelegramClient,
                         location: TypeLocation,
                         out: BinaryIO,
                         progress_callback: callable = None,
-                        file_size: Optional[int] = None
+                        file_size: Optional[int] = None,
+                        connection_count: Optional[int] = None
                         ) -> BinaryIO:
     size = file_size if file_size is not None else location.size
     dc_id, location = utils.get_input_location(location)
     # We lock the transfers because telegram has connection count limits
     downloader = ParallelTransferrer(client, dc_id)
-    downloaded = downloader.download(location, size)
+    downloaded = downloader.download(location, size, connection_count=connection_count)
     async for x in downloaded:
         out.write(x)
         if progress_callback:
@@ -1,8 +1,17 @@
 import os
+import asyncio
 import secrets
+import time
 from datetime import datetime, timedelta
+from functools import reduce
+
+try:
+    from orjson import loads as _loads
+except ImportError:
+    from json import loads as _loads
 
 from logger import LOGGER
+from helpers import http_pool
 try:
     from database_sqlite import db
 except ImportError:
@@ -10,6 +19,83 @@ except ImportError:
 
 PREMIUM_DOWNLOADS = 5
 SESSION_VALIDITY_MINUTES = 30
+SESSION_TTL = timedelta(minutes=SESSION_VALIDITY_MINUTES)
+VERIFY_TTL = timedelta(minutes=30)
+# Socket timeout for a single shortener call before moving to the next one
+SHORTENER_ATTEMPT_TIMEOUT = 3
+
+# Shortener services in rotation order: name -> (API URL, path to short URL in JSON response, label)
+# Requests go through the shared keep-alive pool
+SHORTENER_ENDPOINTS = {
+    'droplink': ("https://droplink.co/api", ("shortenedUrl",), "droplink.co"),
+    'gplinks': ("https://api.gplinks.com/api", ("shortenedUrl",), "gplinks.com"),
+    'shrtfly': ("https://shrtfly.com/api", ("result", "shorten_url"), "shrtfly.com"),
+    'upshrink': ("https://upshrink.com/api", ("shortenedUrl",), "upshrink.com")
+}
+SHORTENER_ROTATION = list(SHORTENER_ENDPOINTS)
+_REQUEST_HEADERS = {'User-Agent': 'Mozilla/5.0'}
+
+# Circuit breaker: after SHORTENER_MAX_FAILURES consecutive failures a service is skipped
+# for SHORTENER_COOLDOWN seconds instead of paying its timeout for every user
+SHORTENER_MAX_FAILURES = 3
+SHORTENER_COOLDOWN = 300
+_breaker = {name: (0, 0.0) for name in SHORTENER_ENDPOINTS}  # name -> (consecutive failures, open until)
+
+def _breaker_open(service: str) -> bool:
+    return _breaker[service][1] > time.monotonic()
+
+def _record_shortener_result(service: str, success: bool):
+    if success:
+        _breaker[service] = (0, 0.0)
+        return
+    failures = _breaker[service][0] + 1
+    if failures >= SHORTENER_MAX_FAILURES:
+        # Count is kept, so after the cooldown a single failed probe reopens the breaker (half-open)
+        _breaker[service] = (failures, time.monotonic() + SHORTENER_COOLDOWN)
+        LOGGER(__name__).warning(f"{service} failed {failures} times in a row, skipping it for {SHORTENER_COOLDOWN}s")
+    else:
+        _breaker[service] = (failures, 0.0)
+
+def _normalize_code(code: str) -> str:
+    """Trim and uppercase a user-entered code, skipping the copies when it's already normalized
+    (handlers already strip the command argument)"""
+    if code[:1].isspace() or code[-1:].isspace():
+        code = code.strip()
+    return code if code.isupper() else code.upper()
+
+# Concurrent /verifypremium lookups are collected for VERIFY_BATCH_WINDOW seconds
+# and resolved with a single db.get_verification_codes() query
+VERIFY_BATCH_WINDOW = 0.02
+_verify_batch: dict[str, list[asyncio.Future]] = {}
+_verify_flush_task: asyncio.Task | None = None
+
+async def _batched_code_lookup(code: str) -> dict | None:
+    """Look up a verification code, sharing the DB query with other lookups in the same window"""
+    global _verify_flush_task
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    _verify_batch.setdefault(code, []).append(future)
+    if _verify_flush_task is None:
+        _verify_flush_task = loop.create_task(_flush_verify_batch())
+    return await future
+
+async def _flush_verify_batch():
+    global _verify_flush_task
+    await asyncio.sleep(VERIFY_BATCH_WINDOW)
+    batch = dict(_verify_batch)
+    _verify_batch.clear()
+    _verify_flush_task = None
+    
+    try:
+        results = await asyncio.to_thread(db.get_verification_codes, list(batch))
+    except Exception as e:
+        LOGGER(__name__).error(f"Batched verification code lookup failed: {e}")
+        results = {}
+    
+    for code, futures in batch.items():
+        for future in futures:
+            if not future.done():
+                future.set_result(results.get(code))
 
 class AdMonetization:
     def __init__(self):
@@ -29,7 +115,8 @@ class AdMonetization:
     
     def create_ad_session(self, user_id: int) -> str:
         """Create a temporary session for ad watching"""
-        session_id = secrets.token_hex(16)
+        # 128 bits as URL-safe base64 (22 chars vs 32 hex) - ad_sessions.session_id is plain TEXT
+        session_id = secrets.token_urlsafe(16)
         db.create_ad_session(session_id, user_id)
         
         LOGGER(__name__).info(f"Created ad session {session_id} for user {user_id}")
@@ -37,45 +124,36 @@ class AdMonetization:
     
     def verify_ad_completion(self, session_id: str) -> tuple[bool, str, str]:
         """Verify that user clicked through droplink and generate verification code"""
-        session_data = db.get_ad_session(session_id)
+        verification_code = self._generate_verification_code()
         
-        if not session_data:
-            return False, "", "❌ Invalid or expired session. Please start over with /getpremium"
+        # Single transaction: validate session, store code, delete session (prevents race condition)
+        # Expired rows are left for the cleanup watchdog's batched sweep (db.cleanup_expired_sessions)
+        status, user_id = db.consume_ad_session(session_id, verification_code, SESSION_TTL)
         
-        # Check if session expired (30 minutes max)
-        elapsed_time = datetime.now() - session_data['created_at']
-        if elapsed_time > timedelta(minutes=SESSION_VALIDITY_MINUTES):
-            db.delete_ad_session(session_id)
+        if status == 'expired':
             return False, "", "⏰ Session expired. Please start over with /getpremium"
-        
-        # Atomically mark session as used (prevents race condition)
-        success = db.mark_ad_session_used(session_id)
-        if not success:
+        if status == 'used':
             return False, "", "❌ This session has already been used. Please use /getpremium to get a new link."
+        if status != 'ok':
+            return False, "", "❌ Invalid or expired session. Please start over with /getpremium"
         
-        # Generate verification code
-        verification_code = self._generate_verification_code(session_data['user_id'])
-        
-        # Delete session after successful verification
-        db.delete_ad_session(session_id)
-        
-        LOGGER(__name__).info(f"User {session_data['user_id']} completed ad session {session_id}, generated code {verification_code}")
+        LOGGER(__name__).info(f"User {user_id} completed ad session {session_id}, generated code {verification_code}")
         return True, verification_code, "✅ Ad completed! Here's your verification code"
     
-    def _generate_verification_code(self, user_id: int) -> str:
-        """Generate verification code after ad is watched"""
-        code = secrets.token_hex(4).upper()
-        db.create_verification_code(code, user_id)
-        
-        LOGGER(__name__).info(f"Generated verification code {code} for user {user_id}")
-        return code
+    def _generate_verification_code(self) -> str:
+        """Generate a verification code (stored by db.consume_ad_session)"""
+        return secrets.token_hex(4).upper()
     
-    def verify_code(self, code: str, user_id: int) -> tuple[bool, str]:
-        """Verify user's code and grant free downloads"""
-        code = code.upper().strip()
-        
-        verification_data = db.get_verification_code(code)
+    async def verify_code_async(self, code: str, user_id: int) -> tuple[bool, str]:
+        """Verify user's code and grant free downloads
         
+        Code lookups arriving within VERIFY_BATCH_WINDOW are served by one DB query.
+        """
+        code = _normalize_code(code)
+        return self._complete_verification(code, user_id, await _batched_code_lookup(code))
+    
+    def _complete_verification(self, code: str, user_id: int, verification_data: dict | None) -> tuple[bool, str]:
+        """Check looked-up code data and grant free downloads"""
         if not verification_data:
             return False, "❌ **Invalid verification code.**\n\nPlease make sure you entered the code correctly or get a new one with `/getpremium`"
         
@@ -83,11 +161,12 @@ class AdMonetization:
             return False, "❌ **This verification code belongs to another user.**"
         
         created_at = verification_data['created_at']
-        if datetime.now() - created_at > timedelta(minutes=30):
-            db.delete_verification_code(code)
+        if datetime.now() - created_at > VERIFY_TTL:
             return False, "⏰ **Verification code has expired.**\n\nCodes expire after 30 minutes. Please get a new one with `/getpremium`"
         
-        db.delete_verification_code(code)
+        # Deleting the code is the claim - a concurrent request that saw the same row gets nothing
+        if not db.delete_verification_code(code):
+            return False, "❌ **Invalid verification code.**\n\nPlease make sure you entered the code correctly or get a new one with `/getpremium`"
         
         # Grant ad downloads
         db.add_ad_downloads(user_id, PREMIUM_DOWNLOADS)
@@ -99,220 +178,67 @@ class AdMonetization:
         LOGGER(__name__).info(f"User {user_id} successfully verified code {code}, granted {PREMIUM_DOWNLOADS} ad downloads")
         return True, f"✅ **Verification successful!**\n\nYou now have **{PREMIUM_DOWNLOADS} free download(s)**!"
     
-    def _shorten_with_droplink_only(self, long_url: str) -> str:
-        """Shorten URL using droplink.co API without fallback"""
-        try:
-            import orjson
-        except ImportError:
-            import json as orjson
-        from urllib.request import urlopen, Request
-        from urllib.parse import urlencode
-        from urllib.error import URLError, HTTPError
-        
-        api_key = self.services.get('droplink')
-        if not api_key:
-            LOGGER(__name__).error("DROPLINK_API_KEY not configured!")
-            return long_url
-        
-        try:
-            params = urlencode({"api": api_key, "url": long_url})
-            url = f"https://droplink.co/api?{params}"
-            
-            req = Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-            with urlopen(req, timeout=10) as response:
-                data = orjson.loads(response.read())
-                
-                if data.get("status") == "success":
-                    short_url = data.get("shortenedUrl")
-                    
-                    if short_url:
-                        LOGGER(__name__).info(f"Successfully shortened URL via droplink.co: {short_url}")
-                        return short_url
-                    else:
-                        LOGGER(__name__).error(f"Droplink API response missing shortenedUrl: {data}")
-                else:
-                    LOGGER(__name__).error(f"Droplink API returned non-success status: {data}")
-        
-        except (URLError, HTTPError) as e:
-            LOGGER(__name__).error(f"Failed to shorten URL with droplink.co: {e}")
-        except Exception as e:
-            LOGGER(__name__).error(f"Failed to shorten URL with droplink.co: {e}")
-        
-        return long_url
-    
-    def _shorten_with_droplink(self, long_url: str) -> str:
-        """Shorten URL using droplink.co API (using urllib instead of requests)"""
-        return self._shorten_with_droplink_only(long_url)
-    
-    def _shorten_with_gplinks_only(self, long_url: str) -> str:
-        """Shorten URL using gplinks.co API without fallback"""
-        try:
-            import orjson
-        except ImportError:
-            import json as orjson
-        from urllib.request import urlopen, Request
-        from urllib.parse import urlencode
-        from urllib.error import URLError, HTTPError
+    def _shorten(self, service: str, long_url: str) -> str:
+        """Shorten URL with a single service (no fallback), returns long_url on failure"""
+        api_url, result_path, label = SHORTENER_ENDPOINTS[service]
         
-        api_key = self.services.get('gplinks')
+        api_key = self.services.get(service)
         if not api_key:
-            LOGGER(__name__).warning("GPLINKS_API_KEY not configured")
+            LOGGER(__name__).warning(f"{service.upper()}_API_KEY not configured")
             return long_url
         
         try:
-            params = urlencode({"api": api_key, "url": long_url})
-            url = f"https://api.gplinks.com/api?{params}"
+            status, body = http_pool.request(
+                "GET", api_url,
+                params={"api": api_key, "url": long_url},
+                headers=_REQUEST_HEADERS,
+                timeout=SHORTENER_ATTEMPT_TIMEOUT
+            )
+            if status != 200:
+                LOGGER(__name__).error(f"Failed to shorten URL with {label}: HTTP {status}")
+                return long_url
             
-            req = Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-            with urlopen(req, timeout=10) as response:
-                data = orjson.loads(response.read())
-                
-                if data.get("status") == "success":
-                    short_url = data.get("shortenedUrl")
-                    
-                    if short_url:
-                        LOGGER(__name__).info(f"Successfully shortened URL via gplinks.com: {short_url}")
-                        return short_url
-                    else:
-                        LOGGER(__name__).error(f"GPLinks API response missing shortenedUrl: {data}")
-                else:
-                    LOGGER(__name__).error(f"GPLinks API returned non-success status: {data}")
-        
-        except (URLError, HTTPError) as e:
-            LOGGER(__name__).error(f"Failed to shorten URL with gplinks.com: {e}")
-        except Exception as e:
-            LOGGER(__name__).error(f"Failed to shorten URL with gplinks.com: {e}")
-        
-        return long_url
-    
-    def _shorten_with_gplinks(self, long_url: str) -> str:
-        """Shorten URL using gplinks.co API (using urllib instead of requests)"""
-        result = self._shorten_with_gplinks_only(long_url)
-        if result == long_url:
-            LOGGER(__name__).info("Falling back to droplink.co")
-            return self._shorten_with_droplink(long_url)
-        return result
-    
-    def _shorten_with_shrtfly_only(self, long_url: str) -> str:
-        """Shorten URL using shrtfly.com API without fallback"""
-        try:
-            import orjson
-        except ImportError:
-            import json as orjson
-        from urllib.request import urlopen, Request
-        from urllib.parse import urlencode
-        from urllib.error import URLError, HTTPError
-        
-        api_key = self.services.get('shrtfly')
-        if not api_key:
-            LOGGER(__name__).warning("SHRTFLY_API_KEY not configured")
-            return long_url
-        
-        try:
-            params = urlencode({"api": api_key, "url": long_url})
-            url = f"https://shrtfly.com/api?{params}"
+            data = _loads(body)
             
-            req = Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-            with urlopen(req, timeout=10) as response:
-                data = orjson.loads(response.read())
+            if data.get("status") == "success":
+                short_url = reduce(lambda d, key: d.get(key) if isinstance(d, dict) else None, result_path, data)
                 
-                if data.get("status") == "success":
-                    result = data.get("result", {})
-                    short_url = result.get("shorten_url")
-                    
-                    if short_url:
-                        LOGGER(__name__).info(f"Successfully shortened URL via shrtfly.com: {short_url}")
-                        return short_url
-                    else:
-                        LOGGER(__name__).error(f"Shrtfly API response missing shorten_url: {data}")
+                if short_url:
+                    LOGGER(__name__).info(f"Successfully shortened URL via {label}: {short_url}")
+                    return short_url
                 else:
-                    LOGGER(__name__).error(f"Shrtfly API returned non-success status: {data}")
-        
-        except (URLError, HTTPError) as e:
-            LOGGER(__name__).error(f"Failed to shorten URL with shrtfly.com: {e}")
-        except Exception as e:
-            LOGGER(__name__).error(f"Failed to shorten URL with shrtfly.com: {e}")
-        
-        return long_url
-    
-    def _shorten_with_shrtfly(self, long_url: str) -> str:
-        """Shorten URL using shrtfly.com API (using urllib instead of requests)"""
-        result = self._shorten_with_shrtfly_only(long_url)
-        if result == long_url:
-            LOGGER(__name__).info("Falling back to droplink.co")
-            return self._shorten_with_droplink(long_url)
-        return result
-    
-    def _shorten_with_upshrink_only(self, long_url: str) -> str:
-        """Shorten URL using upshrink.com API without fallback"""
-        try:
-            import orjson
-        except ImportError:
-            import json as orjson
-        from urllib.request import urlopen, Request
-        from urllib.parse import urlencode
-        from urllib.error import URLError, HTTPError
-        
-        api_key = self.services.get('upshrink')
-        if not api_key:
-            LOGGER(__name__).warning("UPSHRINK_API_KEY not configured")
-            return long_url
-        
-        try:
-            params = urlencode({"api": api_key, "url": long_url})
-            url = f"https://upshrink.com/api?{params}"
-            
-            req = Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-            with urlopen(req, timeout=10) as response:
-                data = orjson.loads(response.read())
-                
-                if data.get("status") == "success":
-                    short_url = data.get("shortenedUrl")
-                    
-                    if short_url:
-                        LOGGER(__name__).info(f"Successfully shortened URL via upshrink.com: {short_url}")
-                        return short_url
-                    else:
-                        LOGGER(__name__).error(f"UpShrink API response missing shortenedUrl: {data}")
-                else:
-                    LOGGER(__name__).error(f"UpShrink API returned non-success status: {data}")
+                    LOGGER(__name__).error(f"{label} API response missing {result_path[-1]}: {data}")
+            else:
+                LOGGER(__name__).error(f"{label} API returned non-success status: {data}")
         
-        except (URLError, HTTPError) as e:
-            LOGGER(__name__).error(f"Failed to shorten URL with upshrink.com: {e}")
         except Exception as e:
-            LOGGER(__name__).error(f"Failed to shorten URL with upshrink.com: {e}")
+            LOGGER(__name__).error(f"Failed to shorten URL with {label}: {e}")
         
         return long_url
     
-    def _shorten_with_upshrink(self, long_url: str) -> str:
-        """Shorten URL using upshrink.com API (using urllib instead of requests)"""
-        result = self._shorten_with_upshrink_only(long_url)
-        if result == long_url:
-            LOGGER(__name__).info("Falling back to droplink.co")
-            return self._shorten_with_droplink(long_url)
-        return result
-    
-    def _try_next_shortener(self, long_url: str, start_index: int, user_id: int) -> tuple[str, str]:
-        """Try shorteners in rotation starting from start_index until one succeeds"""
-        service_map = {
-            0: ('droplink', self._shorten_with_droplink_only),
-            1: ('gplinks', self._shorten_with_gplinks_only),
-            2: ('shrtfly', self._shorten_with_shrtfly_only),
-            3: ('upshrink', self._shorten_with_upshrink_only)
-        }
+    async def _try_next_shortener_async(self, long_url: str, start_index: int, user_id: int) -> tuple[str, str]:
+        """Try shorteners in rotation starting from start_index until one succeeds
         
+        Each attempt runs in a worker thread so the event loop keeps serving other users;
+        the SHORTENER_ATTEMPT_TIMEOUT socket timeout keeps a hanging service from stalling the rotation.
+        """
         # Try all 4 services in rotation
         for i in range(4):
             index = (start_index + i) % 4
-            service_name, shorten_func = service_map[index]
+            service_name = SHORTENER_ROTATION[index]
             
             # Check if this service has API key configured
             if not self.services.get(service_name):
                 LOGGER(__name__).info(f"User {user_id}: {service_name} API key not configured, trying next...")
                 continue
             
+            if _breaker_open(service_name):
+                LOGGER(__name__).info(f"User {user_id}: {service_name} is temporarily disabled after repeated failures, trying next...")
+                continue
+            
             LOGGER(__name__).info(f"User {user_id}: Attempting to shorten with {service_name} (index {index})")
-            short_url = shorten_func(long_url)
+            short_url = await asyncio.to_thread(self._shorten, service_name, long_url)
+            _record_shortener_result(service_name, short_url != long_url)
             
             # If shortening succeeded (URL changed), return it
             if short_url != long_url:
@@ -325,13 +251,14 @@ class AdMonetization:
         LOGGER(__name__).error(f"User {user_id}: All shortener services failed or not configured. User will access bot directly (no ads, no revenue).")
         return long_url, "none"
     
-    def generate_droplink_ad_link(self, user_id: int, bot_domain: str | None = None) -> tuple[str, str]:
+    async def generate_droplink_ad_link_async(self, user_id: int, bot_domain: str | None = None) -> tuple[str, str]:
         """Generate monetized ad link using per-user rotation system
         
         Each user gets different shortener on each /getpremium request:
         1st request: Droplink -> 2nd: GPLinks -> 3rd: Shrtfly -> 4th: UpShrink -> 5th: Droplink (cycle repeats)
         
         If a shortener is not configured or fails, automatically tries the next one in rotation.
+        Shortener calls run in worker threads so they don't block the event loop.
         """
         session_id = self.create_ad_session(user_id)
         
@@ -345,7 +272,7 @@ class AdMonetization:
             LOGGER(__name__).info(f"User {user_id}: Original verify URL: {verify_url}")
             
             # Try shorteners in rotation until one succeeds
-            short_url, used_service = self._try_next_shortener(verify_url, current_index, user_id)
+            short_url, used_service = await self._try_next_shortener_async(verify_url, current_index, user_id)
             
             # Log whether shortening succeeded
             if short_url == verify_url:
@@ -5,6 +5,7 @@ Backs up telegram_bot.db to prevent data loss during deployments
 """
 
 import os
+import heapq
 import shutil
 import sqlite3
 from datetime import datetime
@@ -12,6 +13,17 @@ from pathlib import Path
 import asyncio
 from logger import LOGGER
 
+try:
+    import orjson
+    
+    def _json_dumps(obj) -> bytes:
+        return orjson.dumps(obj, default=str)
+except ImportError:
+    import json
+    
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj, default=str).encode()
+
 BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
 DB_PATH = os.getenv("DATABASE_PATH", "telegram_bot.db")
 MAX_LOCAL_BACKUPS = int(os.getenv("MAX_BACKUPS", "2"))
@@ -34,14 +46,23 @@ def backup_database():
     backup_path = os.path.join(BACKUP_DIR, backup_filename)
     
     try:
-        conn = sqlite3.connect(DB_PATH)
+        # Read-only source; the copy is a throwaway file so skip its journal and per-page syncs
+        conn = sqlite3.connect(f"{Path(DB_PATH).resolve().as_uri()}?mode=ro", uri=True)
         backup_conn = sqlite3.connect(backup_path)
+        try:
+            backup_conn.execute("PRAGMA journal_mode=OFF")
+            backup_conn.execute("PRAGMA synchronous=OFF")
+            conn.backup(backup_conn, pages=-1)
+        finally:
+            conn.close()
+            backup_conn.close()
         
-        with backup_conn:
-            conn.backup(backup_conn)
-        
-        conn.close()
-        backup_conn.close()
+        # Single fsync once the whole copy is written
+        fd = os.open(backup_path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
         
         file_size = os.path.getsize(backup_path) / 1024
         LOGGER(__name__).info(f"✅ Database backed up successfully: {backup_filename} ({file_size:.2f} KB)")
@@ -53,19 +74,21 @@ def backup_database():
         LOGGER(__name__).error(f"❌ Backup failed: {e}")
         return None
 
+def _list_backup_entries():
+    """Scan BACKUP_DIR once and return DirEntry objects for local backup files"""
+    with os.scandir(BACKUP_DIR) as it:
+        return [e for e in it if e.name.startswith("telegram_bot_backup_") and e.name.endswith(".db")]
+
 def cleanup_old_backups():
     """Remove old backups to save space, keeping only the most recent ones"""
     try:
-        backups = sorted(
-            [f for f in os.listdir(BACKUP_DIR) if f.startswith("telegram_bot_backup_") and f.endswith(".db")],
-            reverse=True
-        )
+        entries = _list_backup_entries()
         
-        if len(backups) > MAX_LOCAL_BACKUPS:
-            for old_backup in backups[MAX_LOCAL_BACKUPS:]:
-                old_path = os.path.join(BACKUP_DIR, old_backup)
-                os.remove(old_path)
-                LOGGER(__name__).info(f"🗑️ Removed old backup: {old_backup}")
+        if len(entries) > MAX_LOCAL_BACKUPS:
+            # Filenames carry the timestamp, so the smallest names are the oldest
+            for old_backup in heapq.nsmallest(len(entries) - MAX_LOCAL_BACKUPS, entries, key=lambda e: e.name):
+                os.remove(old_backup.path)
+                LOGGER(__name__).info(f"🗑️ Removed old backup: {old_backup.name}")
     except Exception as e:
         LOGGER(__name__).error(f"Error cleaning up old backups: {e}")
 
@@ -93,29 +116,27 @@ def get_latest_backup():
     if not os.path.exists(BACKUP_DIR):
         return None
     
-    backups = sorted(
-        [f for f in os.listdir(BACKUP_DIR) if f.startswith("telegram_bot_backup_") and f.endswith(".db")],
-        reverse=True
-    )
-    
-    return os.path.join(BACKUP_DIR, backups[0]) if backups else None
+    latest = max(_list_backup_entries(), key=lambda e: e.name, default=None)
+    return latest.path if latest else None
 
 async def periodic_backup(interval_hours=1):
     """Run periodic backups in the background"""
     while True:
         try:
             LOGGER(__name__).info(f"⏰ Starting scheduled local backup (interval: {interval_hours}h)")
-            backup_database()
+            # Blocking SQLite copy + file I/O, keep it off the event loop
+            await asyncio.to_thread(backup_database)
             await asyncio.sleep(interval_hours * 3600)
         except Exception as e:
             LOGGER(__name__).error(f"Error in periodic backup: {e}")
             await asyncio.sleep(3600)
 
 def export_to_json(output_file="database_export.json"):
-    """Export database to JSON for easy transfer (optional)"""
+    """Export database to JSON for easy transfer (optional)
+    
+    Rows are streamed to the file one at a time instead of building the whole export in memory.
+    """
     try:
-        import json
-        
         if not os.path.exists(DB_PATH):
             LOGGER(__name__).error("Database not found")
             return False
@@ -123,20 +144,30 @@ def export_to_json(output_file="database_export.json"):
         conn = sqlite3.connect(DB_PATH)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
-        
-        export_data = {}
+        cursor.arraysize = 1000
         
         tables = ['users', 'admins', 'daily_usage', 'broadcasts', 'ad_sessions', 'ad_verifications']
         
-        for table in tables:
-            cursor.execute(f"SELECT * FROM {table}")
-            rows = cursor.fetchall()
-            export_data[table] = [dict(row) for row in rows]
-        
-        conn.close()
-        
-        with open(output_file, 'w') as f:
-            json.dump(export_data, f, indent=2, default=str)
+        try:
+            with open(output_file, 'wb') as f:
+                f.write(b'{')
+                for table_index, table in enumerate(tables):
+                    if table_index:
+                        f.write(b',')
+                    f.write(_json_dumps(table) + b':[')
+                    
+                    cursor.execute(f"SELECT * FROM {table}")
+                    first = True
+                    while rows := cursor.fetchmany():
+                        for row in rows:
+                            if not first:
+                                f.write(b',')
+                            f.write(_json_dumps(dict(row)))
+                            first = False
+                    f.write(b']')
+                f.write(b'}')
+        finally:
+            conn.close()
         
         file_size = os.path.getsize(output_file) / 1024
         LOGGER(__name__).info(f"✅ Database exported to JSON: {output_file} ({file_size:.2f} KB)")
@@ -171,15 +202,11 @@ if __name__ == "__main__":
         export_to_json()
     elif choice == "4":
         create_backup_dir()
-        backups = sorted(
-            [f for f in os.listdir(BACKUP_DIR) if f.startswith("telegram_bot_backup_")],
-            reverse=True
-        )
+        backups = sorted(_list_backup_entries(), key=lambda e: e.name, reverse=True)
         if backups:
             print("\nAvailable backups:")
             for i, backup in enumerate(backups, 1):
-                path = os.path.join(BACKUP_DIR, backup)
-                size = os.path.getsize(path) / 1024
-                print(f"{i}. {backup} ({size:.2f} KB)")
+                size = backup.stat().st_size / 1024
+                print(f"{i}. {backup.name} ({size:.2f} KB)")
         else:
             print("\nNo backups found!")
@@ -5,75 +5,268 @@ Automatically backs up database to GitHub repository
 """
 
 import os
+import time
+import base64
+import asyncio
+import shutil
+import heapq
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+from operator import itemgetter
 from backup_database import backup_database, restore_database
 from logger import LOGGER
-import threading
+from helpers import http_pool
+
+try:
+    from orjson import dumps as _dumps, loads as _loads
+except ImportError:
+    import json
+    
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj).encode()
+    
+    _loads = json.loads
 
 DB_PATH = os.getenv("DATABASE_PATH", "telegram_bot.db")
 
-# Concurrency control for backup operations
-_backup_lock = threading.Lock()
-_backup_in_progress = False
+# Read once at import - the triggers run on every critical DB write
+try:
+    from config import PyroConf
+    _BACKUP_SERVICE = PyroConf.CLOUD_BACKUP_SERVICE
+except Exception:
+    _BACKUP_SERVICE = os.getenv("CLOUD_BACKUP_SERVICE", "").lower()
+_BACKUP_ENABLED = _BACKUP_SERVICE == "github"
+
+# GitHub API calls share one keep-alive connection (helpers.http_pool)
+GITHUB_API_URL = "https://api.github.com"
+GITHUB_TIMEOUT = 60
+GITHUB_KEEP_BACKUPS = 2
+GITHUB_USER_AGENT = "telegram-bot-backup"
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+_DOWNLOAD_HEADERS = {"User-Agent": GITHUB_USER_AGENT}
+# Transient gateway errors are retried with exponential backoff (0.5s, 1s, 2s)
+_RETRY_STATUSES = (502, 503, 504)
+_MAX_RETRIES = 3
+_RETRY_BACKOFF = 0.5
+
+class GitHubAPIError(Exception):
+    """Non-2xx response from the GitHub API"""
+    def __init__(self, status: int, method: str, url: str, rate_limited: bool = False):
+        super().__init__(f"HTTP {status} for {method} {url}")
+        self.status = status
+        self.rate_limited = rate_limited
+
+@lru_cache(maxsize=4)
+def _gh_headers(token):
+    """GitHub API headers, built once per token (shared dict - don't mutate)"""
+    headers = {
+        "Accept": "application/vnd.github.v3+json",
+        "User-Agent": GITHUB_USER_AGENT
+    }
+    if token:
+        headers["Authorization"] = f"token {token}"
+    return headers
+
+def _gh_request(method, url, token=None, data=None):
+    """Send a GitHub request over the pooled connection, returns (status, raw body)"""
+    headers = _gh_headers(token)
+    body = _dumps(data) if data is not None else None
+    
+    for attempt in range(_MAX_RETRIES + 1):
+        with http_pool.open_url(method, url, body=body, headers=headers, timeout=GITHUB_TIMEOUT) as response:
+            status, payload = response.status, response.read()
+            rate_limited = status in (403, 429) and response.getheader("X-RateLimit-Remaining") == "0"
+        if status not in _RETRY_STATUSES or attempt == _MAX_RETRIES:
+            break
+        time.sleep(_RETRY_BACKOFF * 2 ** attempt)
+    
+    if status >= 400:
+        raise GitHubAPIError(status, method, url, rate_limited)
+    return status, payload
+
+def _gh_download(url, path):
+    """Stream a file from GitHub straight to disk in DOWNLOAD_CHUNK_SIZE pieces"""
+    with http_pool.open_url("GET", url, headers=_DOWNLOAD_HEADERS, timeout=GITHUB_TIMEOUT) as response:
+        if response.status >= 400:
+            raise GitHubAPIError(response.status, "GET", url)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(response, f, DOWNLOAD_CHUNK_SIZE)
+
+def _gh_json(method, url, token=None, data=None):
+    """GitHub API call returning (status, decoded JSON body)"""
+    status, payload = _gh_request(method, url, token, data)
+    return status, _loads(payload) if payload else None
+
+# Triggered backups are debounced: a burst of changes results in a single upload
+# BACKUP_DEBOUNCE_SECONDS after the last trigger, but no later than BACKUP_MAX_DELAY_SECONDS
+# after the first one, so steady traffic still gets backed up. The wait runs on a timer;
+# uploads run on one long-lived worker
+BACKUP_DEBOUNCE_SECONDS = 5
+BACKUP_MAX_DELAY_SECONDS = 60
+_backup_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="Backup")
+_trigger_lock = threading.Lock()
+_first_trigger = None  # start of the current batch of triggers, None when no timer is armed
+_last_trigger = 0.0
+_last_reason = ""
+_pending_triggers = 0
+# A submitted upload that hasn't started yet covers any batch that comes due meanwhile
+_upload_queued = False
 
-def cleanup_old_github_backups(token, repo, keep_count=2):
-    """Delete old backups from GitHub, keeping only the newest ones"""
+# Short-lived cache of the backups/ listing per repo: repo -> (fetched at, entries)
+# Dropped after each upload, since the upload commit changes the listing
+LISTING_TTL = 45
+COMMIT_RETRIES = 3
+_listing_cache = {}
+
+def _list_backups(token, repo, ttl=LISTING_TTL):
+    """List files in the repo's backups/ folder, served from cache when fresh"""
+    cached = _listing_cache.get(repo)
+    if cached and time.monotonic() - cached[0] < ttl:
+        return cached[1]
+    
     try:
-        import urllib.request
-        import json
-        
-        list_url = f"https://api.github.com/repos/{repo}/contents/backups"
-        headers = {
-            "Authorization": f"token {token}",
-            "Accept": "application/vnd.github.v3+json"
-        }
-        
-        req = urllib.request.Request(list_url, headers=headers)
-        with urllib.request.urlopen(req) as response:
-            backups = json.loads(response.read().decode())
-        
-        if not backups or len(backups) <= keep_count:
-            return
-        
-        sorted_backups = sorted(backups, key=lambda x: x['name'], reverse=True)
-        backups_to_delete = sorted_backups[keep_count:]
-        
-        for backup in backups_to_delete:
-            try:
-                delete_url = f"https://api.github.com/repos/{repo}/contents/{backup['path']}"
-                
-                req = urllib.request.Request(delete_url, headers=headers)
-                with urllib.request.urlopen(req) as resp:
-                    file_data = json.loads(resp.read().decode())
-                
-                data = {
-                    "message": f"Cleanup: Remove old backup {backup['name']}",
-                    "sha": file_data['sha']
-                }
-                
-                req = urllib.request.Request(
-                    delete_url,
-                    data=json.dumps(data).encode(),
-                    headers=headers,
-                    method='DELETE'
-                )
-                
-                with urllib.request.urlopen(req) as response:
-                    if response.status == 200:
-                        LOGGER(__name__).info(f"🗑️ Deleted old backup: {backup['name']}")
-            except Exception as e:
-                LOGGER(__name__).warning(f"Failed to delete {backup['name']}: {e}")
+        _, backups = _gh_json("GET", f"{GITHUB_API_URL}/repos/{repo}/contents/backups", token)
+    except GitHubAPIError as e:
+        if e.status != 404:
+            raise
+        backups = None  # backups/ folder doesn't exist yet
+    backups = backups or []
+    _listing_cache[repo] = (time.monotonic(), backups)
+    return backups
+
+@lru_cache(maxsize=4)
+def _default_branch(token, repo):
+    """The backup repo's default branch (where the Contents API writes), fetched once"""
+    _, info = _gh_json("GET", f"{GITHUB_API_URL}/repos/{repo}", token)
+    return info['default_branch']
+
+def _branch_head(token, repo, branch):
+    """Commit sha the branch points at, or None if it doesn't exist yet (empty repo)"""
+    try:
+        _, ref = _gh_json("GET", f"{GITHUB_API_URL}/repos/{repo}/git/ref/heads/{branch}", token)
+    except GitHubAPIError as e:
+        # GitHub answers 409 "Git Repository is empty" for any ref of an empty repo
+        if e.status in (404, 409):
+            return None
+        raise
+    return ref['object']['sha']
+
+def _commit_tree_changes(token, repo, branch, tree_changes, message, head=None):
+    """
+    Apply several file changes to the branch as a single commit (Git Data API)
     
+    tree_changes are git tree entries; an entry with "sha": None deletes that path.
+    head is the branch's current commit if already known. Retries from a fresh ref
+    if the branch moved underneath us (non fast-forward).
+    """
+    repo_url = f"{GITHUB_API_URL}/repos/{repo}/git"
+    
+    for attempt in range(COMMIT_RETRIES + 1):
+        try:
+            parent_sha = head if head and attempt == 0 else _branch_head(token, repo, branch)
+            if parent_sha is None:
+                raise GitHubAPIError(404, "GET", f"{repo_url}/ref/heads/{branch}")
+            _, parent = _gh_json("GET", f"{repo_url}/commits/{parent_sha}", token)
+            
+            _, tree = _gh_json("POST", f"{repo_url}/trees", token, {
+                "base_tree": parent['tree']['sha'],
+                "tree": tree_changes
+            })
+            _, commit = _gh_json("POST", f"{repo_url}/commits", token, {
+                "message": message,
+                "tree": tree['sha'],
+                "parents": [parent_sha]
+            })
+        except GitHubAPIError as e:
+            # A 422 from the tree/commit POST is a bad payload and goes straight to the caller
+            if attempt == COMMIT_RETRIES or not e.rate_limited:
+                raise
+            time.sleep(2 ** attempt)
+            continue
+        
+        try:
+            _gh_request("PATCH", f"{repo_url}/refs/heads/{branch}", token, {"sha": commit['sha']})
+            return commit['sha']
+        except GitHubAPIError as e:
+            # 422 on the ref update: the branch moved (not a fast-forward), rebuild on the new head
+            if attempt == COMMIT_RETRIES or not (e.rate_limited or e.status == 422):
+                raise
+            time.sleep(2 ** attempt)
+
+def _stale_backups(backups, keep_count):
+    """Backups beyond the newest keep_count (names carry the timestamp)"""
+    if len(backups) <= keep_count:
+        return []
+    return heapq.nsmallest(len(backups) - keep_count, backups, key=itemgetter('name'))
+
+def _tree_delete(path):
+    return {"path": path, "mode": "100644", "type": "blob", "sha": None}
+
+# (size, sha1) of the last backup uploaded to GitHub, persisted next to the database
+# so a restart doesn't re-upload a database that GitHub already has
+UPLOAD_STAT_PATH = f"{DB_PATH}.uploaded"
+
+def _load_upload_stat():
+    try:
+        with open(UPLOAD_STAT_PATH, "rb") as f:
+            stat = _loads(f.read())
+        return (stat['size'], stat['sha1'])
+    except FileNotFoundError:
+        return None
     except Exception as e:
-        LOGGER(__name__).warning(f"Cleanup failed: {e}")
+        LOGGER(__name__).warning(f"Ignoring unreadable {UPLOAD_STAT_PATH}: {e}")
+        return None
+
+def _save_upload_stat(path, upload_stat):
+    """Atomically record the uploaded backup's stat (temp file + fsync + rename)"""
+    global _last_upload_stat
+    _last_upload_stat = upload_stat
+    size, sha1 = upload_stat
+    tmp_path = f"{UPLOAD_STAT_PATH}.tmp"
+    try:
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, _dumps({'mtime': os.path.getmtime(path), 'size': size, 'sha1': sha1}))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, UPLOAD_STAT_PATH)
+    except OSError as e:
+        LOGGER(__name__).warning(f"Could not persist upload state: {e}")
+
+_last_upload_stat = _load_upload_stat()
+
+def _file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        while chunk := f.read(DOWNLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Multiple of 3 so per-chunk base64 output concatenates without padding
+_B64_CHUNK_SIZE = 57 * 1024
+
+def _read_base64(path):
+    """Base64-encode a file chunk by chunk instead of holding the raw file and its encoding at once"""
+    buf = bytearray()
+    with open(path, "rb") as f:
+        while chunk := f.read(_B64_CHUNK_SIZE):
+            buf += base64.b64encode(chunk)
+    return buf.decode("ascii")
+
+# Serializes uploads from the periodic task, triggered backups and manual runs
+_upload_lock = threading.Lock()
 
 def backup_to_github():
-    """Upload database backup to GitHub repository"""
+    """Upload database backup to GitHub repository (one upload at a time)"""
+    with _upload_lock:
+        return _backup_to_github()
+
+def _backup_to_github():
     try:
-        import base64
-        import urllib.request
-        import json
-        
         token = os.getenv("GITHUB_TOKEN")
         repo = os.getenv("GITHUB_BACKUP_REPO")
         
@@ -85,74 +278,136 @@ def backup_to_github():
         if not local_backup:
             return False
         
-        with open(local_backup, "rb") as f:
-            content = base64.b64encode(f.read()).decode()
+        # Backups of an unchanged database are byte-identical, so skip the upload when the hash matches
+        upload_stat = (os.path.getsize(local_backup), _file_sha1(local_backup))
+        if upload_stat == _last_upload_stat:
+            LOGGER(__name__).debug("Database unchanged since last GitHub upload, skipping")
+            return True
+        
+        content = _read_base64(local_backup)
         
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         file_path = f"backups/backup_{timestamp}.db"
         
-        url = f"https://api.github.com/repos/{repo}/contents/{file_path}"
+        message = f"Automated backup - {timestamp}"
+        branch = _default_branch(token, repo)
+        head = _branch_head(token, repo, branch)
         
-        data = {
-            "message": f"Automated backup - {timestamp}",
-            "content": content
-        }
+        if head is None:
+            # Empty repo: the Git Data API needs an existing branch, the Contents API creates it
+            _gh_request("PUT", f"{GITHUB_API_URL}/repos/{repo}/contents/{file_path}", token, {
+                "message": message,
+                "content": content
+            })
+            del content
+            backups_to_delete = []
+        else:
+            _, blob = _gh_json("POST", f"{GITHUB_API_URL}/repos/{repo}/git/blobs", token, {
+                "content": content,
+                "encoding": "base64"
+            })
+            del content
+            
+            # Add the new backup and drop stale ones in the same commit
+            try:
+                backups_to_delete = _stale_backups(_list_backups(token, repo), keep_count=GITHUB_KEEP_BACKUPS - 1)
+            except Exception as e:
+                LOGGER(__name__).warning(f"Could not list old backups, skipping cleanup: {e}")
+                backups_to_delete = []
+            
+            tree_changes = [{"path": file_path, "mode": "100644", "type": "blob", "sha": blob['sha']}]
+            backups_to_delete = [b for b in backups_to_delete if b['path'] != file_path]
+            
+            try:
+                _commit_tree_changes(token, repo, branch,
+                                     tree_changes + [_tree_delete(b['path']) for b in backups_to_delete],
+                                     message, head=head)
+            except GitHubAPIError as e:
+                if not backups_to_delete:
+                    raise
+                # Cleanup must not cost the backup itself (e.g. a stale listing naming a path that's gone)
+                LOGGER(__name__).warning(f"Backup commit with cleanup failed ({e}), retrying without cleanup")
+                backups_to_delete = []
+                _commit_tree_changes(token, repo, branch, tree_changes, message)
         
-        headers = {
-            "Authorization": f"token {token}",
-            "Accept": "application/vnd.github.v3+json"
-        }
+        _listing_cache.pop(repo, None)
+        _save_upload_stat(local_backup, upload_stat)
         
-        req = urllib.request.Request(url, data=json.dumps(data).encode(), headers=headers, method='PUT')
+        LOGGER(__name__).info(f"✅ Uploaded to GitHub: {file_path}")
+        for backup in backups_to_delete:
+            LOGGER(__name__).info(f"🗑️ Deleted old backup: {backup['name']}")
         
-        with urllib.request.urlopen(req) as response:
-            if response.status == 201:
-                LOGGER(__name__).info(f"✅ Uploaded to GitHub: {file_path}")
-                
-                cleanup_old_github_backups(token, repo, keep_count=2)
-                
-                return True
-            else:
-                LOGGER(__name__).error(f"GitHub upload failed: {response.status}")
-                return False
+        return True
                 
     except Exception as e:
         LOGGER(__name__).error(f"❌ GitHub backup failed: {e}")
         return False
 
-def trigger_backup_on_session(user_id):
-    """Trigger backup when new user session is created (non-blocking, thread-safe)"""
-    global _backup_in_progress
-    
-    backup_service = os.getenv("CLOUD_BACKUP_SERVICE", "").lower()
-    if backup_service != "github":
-        return False
+def _start_debounce_timer(delay):
+    timer = threading.Timer(delay, _debounce_elapsed)
+    timer.name = "BackupDebounce"
+    timer.daemon = True
+    timer.start()
+
+def _schedule_backup(reason):
+    """Record a change; arm the debounce timer unless a batch is already pending"""
+    global _first_trigger, _last_trigger, _last_reason, _pending_triggers
+    with _trigger_lock:
+        _last_trigger = time.monotonic()
+        _last_reason = reason
+        _pending_triggers += 1
+        coalesced = _first_trigger is not None
+        if not coalesced:
+            _first_trigger = _last_trigger
+            _start_debounce_timer(BACKUP_DEBOUNCE_SECONDS)
     
-    with _backup_lock:
-        if _backup_in_progress:
-            LOGGER(__name__).debug(f"Backup already in progress, skipping trigger for user {user_id}")
-            return False
+    if coalesced:
+        LOGGER(__name__).debug(f"Backup already pending, coalescing: {reason}")
+    return not coalesced
+
+def _debounce_elapsed():
+    """Timer callback: re-arm while triggers keep coming, otherwise hand the batch to the worker"""
+    global _first_trigger, _pending_triggers, _upload_queued
+    with _trigger_lock:
+        due = min(_last_trigger + BACKUP_DEBOUNCE_SECONDS, _first_trigger + BACKUP_MAX_DELAY_SECONDS)
+        remaining = due - time.monotonic()
+        if remaining > 0:
+            _start_debounce_timer(remaining)
+            return
         
-        _backup_in_progress = True
+        # Changes after this point are not guaranteed to be in this upload, so they start a new batch
+        triggers, reason = _pending_triggers, _last_reason
+        _first_trigger = None
+        _pending_triggers = 0
+        if _upload_queued:
+            LOGGER(__name__).debug(f"Upload already queued, it will include: {reason}")
+            return
+        _upload_queued = True
     
-    def _backup_worker():
-        global _backup_in_progress
-        try:
-            LOGGER(__name__).info(f"🔐 New session created for user {user_id}, triggering backup...")
-            backup_to_github()
-        except Exception as e:
-            LOGGER(__name__).error(f"Session backup failed: {e}")
-        finally:
-            with _backup_lock:
-                _backup_in_progress = False
+    _backup_executor.submit(_triggered_backup, reason, triggers)
+
+def _triggered_backup(reason, triggers):
+    """Worker job: upload once for a whole batch of triggers"""
+    global _upload_queued
+    with _trigger_lock:
+        _upload_queued = False
+    
+    try:
+        LOGGER(__name__).info(f"{reason}, triggering backup ({triggers} change(s) coalesced)...")
+        backup_to_github()
+    except Exception as e:
+        LOGGER(__name__).error(f"Triggered backup failed: {e}")
+
+def trigger_backup_on_session(user_id):
+    """Trigger backup when new user session is created (non-blocking, debounced)"""
+    if not _BACKUP_ENABLED:
+        return False
     
-    thread = threading.Thread(target=_backup_worker, daemon=True, name=f"SessionBackup-{user_id}")
-    thread.start()
-    return True
+    return _schedule_backup(f"🔐 New session created for user {user_id}")
 
 def trigger_backup_on_critical_change(operation_name, user_id=None):
     """
-    Trigger backup when critical database changes occur (non-blocking, thread-safe)
+    Trigger backup when critical database changes occur (non-blocking, debounced)
     
     Critical operations that trigger backup:
     - add_ad_downloads: User earns ad download credits
@@ -163,34 +418,11 @@ def trigger_backup_on_critical_change(operation_name, user_id=None):
     
     This prevents data loss on Render/VPS restarts!
     """
-    global _backup_in_progress
-    
-    backup_service = os.getenv("CLOUD_BACKUP_SERVICE", "").lower()
-    if backup_service != "github":
+    if not _BACKUP_ENABLED:
         return False
     
-    with _backup_lock:
-        if _backup_in_progress:
-            LOGGER(__name__).debug(f"Backup already in progress, skipping trigger for {operation_name}")
-            return False
-        
-        _backup_in_progress = True
-    
-    def _backup_worker():
-        global _backup_in_progress
-        try:
-            user_info = f" (user {user_id})" if user_id else ""
-            LOGGER(__name__).info(f"💾 Critical change detected: {operation_name}{user_info}, triggering backup...")
-            backup_to_github()
-        except Exception as e:
-            LOGGER(__name__).error(f"Critical change backup failed: {e}")
-        finally:
-            with _backup_lock:
-                _backup_in_progress = False
-    
-    thread = threading.Thread(target=_backup_worker, daemon=True, name=f"CriticalBackup-{operation_name}")
-    thread.start()
-    return True
+    user_info = f" (user {user_id})" if user_id else ""
+    return _schedule_backup(f"💾 Critical change detected: {operation_name}{user_info}")
 
 def restore_from_github(backup_name=None):
     """
@@ -203,10 +435,6 @@ def restore_from_github(backup_name=None):
     - This ensures user data is preserved across service restarts
     """
     try:
-        import base64
-        import urllib.request
-        import json
-        
         token = os.getenv("GITHUB_TOKEN")
         repo = os.getenv("GITHUB_BACKUP_REPO")
         
@@ -215,41 +443,31 @@ def restore_from_github(backup_name=None):
             return False
         
         if not backup_name:
-            list_url = f"https://api.github.com/repos/{repo}/contents/backups"
-            headers = {
-                "Authorization": f"token {token}",
-                "Accept": "application/vnd.github.v3+json"
-            }
-            
-            req = urllib.request.Request(list_url, headers=headers)
-            
-            with urllib.request.urlopen(req) as response:
-                backups = json.loads(response.read().decode())
+            backups = _list_backups(token, repo)
             
             if not backups:
                 LOGGER(__name__).warning("No backups found in GitHub")
                 return False
             
-            # CRITICAL: Sort by name (contains timestamp) and get the NEWEST (first) backup
-            latest = sorted(backups, key=lambda x: x['name'], reverse=True)[0]
+            # CRITICAL: Name contains the timestamp, so the max name is the NEWEST backup
+            latest = max(backups, key=itemgetter('name'))
             backup_name = latest['name']
             download_url = latest['download_url']
         else:
-            download_url = f"https://raw.githubusercontent.com/{repo}/main/backups/{backup_name}"
-        
-        req = urllib.request.Request(download_url)
-        
-        with urllib.request.urlopen(req) as response:
-            backup_content = response.read()
+            branch = _default_branch(token, repo)
+            download_url = f"https://raw.githubusercontent.com/{repo}/{branch}/backups/{backup_name}"
         
         temp_path = "temp_restore.db"
-        with open(temp_path, "wb") as f:
-            f.write(backup_content)
-        
-        success = restore_database(temp_path)
-        
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+        try:
+            _gh_download(download_url, temp_path)
+            restored_stat = (os.path.getsize(temp_path), _file_sha1(temp_path))
+            success = restore_database(temp_path)
+            if success:
+                # The restored database is exactly what GitHub holds; its next backup needn't be uploaded
+                _save_upload_stat(temp_path, restored_stat)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
         
         if success:
             LOGGER(__name__).info(f"✅ Restored from GitHub: {backup_name}")
@@ -261,11 +479,7 @@ def restore_from_github(backup_name=None):
 
 async def periodic_cloud_backup(interval_minutes=10):
     """Run periodic GitHub backups in the background"""
-    import asyncio
-    
-    backup_service = os.getenv("CLOUD_BACKUP_SERVICE", "").lower()
-    
-    if backup_service != "github":
+    if not _BACKUP_ENABLED:
         LOGGER(__name__).debug("GitHub backup not enabled")
         return
     
@@ -274,26 +488,19 @@ async def periodic_cloud_backup(interval_minutes=10):
     while True:
         try:
             await asyncio.sleep(interval_minutes * 60)
-            backup_to_github()
+            await asyncio.to_thread(backup_to_github)
         except Exception as e:
             LOGGER(__name__).error(f"Error in periodic GitHub backup: {e}")
             await asyncio.sleep(600)
 
 async def restore_latest_from_cloud():
     """Restore latest backup from GitHub"""
-    # Import config to get cloud backup settings
-    try:
-        from config import PyroConf
-        backup_service = PyroConf.CLOUD_BACKUP_SERVICE
-    except:
-        backup_service = os.getenv("CLOUD_BACKUP_SERVICE", "").lower()
-    
-    if not backup_service or backup_service != "github":
-        LOGGER(__name__).debug(f"GitHub backup not configured (service: {backup_service})")
+    if not _BACKUP_ENABLED:
+        LOGGER(__name__).debug(f"GitHub backup not configured (service: {_BACKUP_SERVICE})")
         return False
     
     LOGGER(__name__).info("Attempting to restore from GitHub...")
-    return restore_from_github()
+    return await asyncio.to_thread(restore_from_github)
 
 if __name__ == "__main__":
     print("=" * 60)
@@ -307,5 +514,4 @@ if __name__ == "__main__":
     if choice == "1":
         backup_to_github()
     elif choice == "2":
-        import asyncio
         asyncio.run(restore_latest_from_cloud())
@@ -712,6 +712,42 @@ class DatabaseManager:
             LOGGER(__name__).error(f"Error deleting ad session: {e}")
             return False
 
+    def consume_ad_session(self, session_id: str, code: str, max_age: timedelta) -> tuple[str, Optional[int]]:
+        """Validate an ad session, store its verification code and delete the session in one transaction.
+        Returns (status, user_id) where status is 'ok', 'invalid', 'expired', 'used' or 'error'."""
+        try:
+            with self.lock:
+                conn = self._get_connection()
+                conn.isolation_level = None
+                cursor = conn.cursor()
+                try:
+                    cursor.execute('BEGIN IMMEDIATE')
+                    cursor.execute('SELECT user_id, created_at, used FROM ad_sessions WHERE session_id = ?', (session_id,))
+                    row = cursor.fetchone()
+                    
+                    if not row:
+                        status, user_id = 'invalid', None
+                    elif datetime.now() - datetime.fromisoformat(row['created_at']) > max_age:
+                        status, user_id = 'expired', row['user_id']
+                    elif row['used']:
+                        status, user_id = 'used', row['user_id']
+                    else:
+                        status, user_id = 'ok', row['user_id']
+                        cursor.execute('INSERT INTO ad_verifications (code, user_id, created_at) VALUES (?, ?, ?)',
+                                       (code, user_id, datetime.now().isoformat()))
+                        cursor.execute('DELETE FROM ad_sessions WHERE session_id = ?', (session_id,))
+                    
+                    cursor.execute('COMMIT')
+                except Exception:
+                    cursor.execute('ROLLBACK')
+                    raise
+                finally:
+                    conn.close()
+            return status, user_id
+        except Exception as e:
+            LOGGER(__name__).error(f"Error consuming ad session: {e}")
+            return 'error', None
+
     def create_verification_code(self, code: str, user_id: int) -> bool:
         try:
             with self.lock:
@@ -743,15 +779,38 @@ class DatabaseManager:
             LOGGER(__name__).error(f"Error getting verification code: {e}")
             return None
 
+    def get_verification_codes(self, codes: List[str]) -> Dict[str, Dict]:
+        """Look up several verification codes in one query. Returns {code: data} for codes that exist."""
+        if not codes:
+            return {}
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            placeholders = ','.join('?' * len(codes))
+            cursor.execute(f'SELECT * FROM ad_verifications WHERE code IN ({placeholders})', codes)
+            rows = cursor.fetchall()
+            conn.close()
+            
+            verifications = {}
+            for row in rows:
+                verification = dict(row)
+                verification['created_at'] = datetime.fromisoformat(verification['created_at'])
+                verifications[verification['code']] = verification
+            return verifications
+        except Exception as e:
+            LOGGER(__name__).error(f"Error getting verification codes: {e}")
+            return {}
+
     def delete_verification_code(self, code: str) -> bool:
         try:
             with self.lock:
                 conn = self._get_connection()
                 cursor = conn.cursor()
                 cursor.execute('DELETE FROM ad_verifications WHERE code = ?', (code,))
+                success = cursor.rowcount > 0
                 conn.commit()
                 conn.close()
-            return True
+            return success
         except Exception as e:
             LOGGER(__name__).error(f"Error deleting verification code: {e}")
             return False
@@ -0,0 +1,185 @@
+# Keep-alive HTTPS connection pool built on http.client
+# Reuses TLS connections per host instead of paying a full handshake per request
+# (urllib.request.urlopen opens and closes a fresh connection every call)
+
+import http.client
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlencode, urljoin, urlsplit
+
+DEFAULT_TIMEOUT = 10
+MAX_IDLE_PER_HOST = 8
+# Redirects are followed like urlopen did, up to this many hops
+MAX_REDIRECTS = 5
+_REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+# Only these are silently resent when a pooled connection turns out to be dead -
+# a POST/PATCH/DELETE may already have reached the server
+_IDEMPOTENT_METHODS = ("GET", "HEAD")
+# Idle connections older than this are closed instead of reused, since the server has likely
+# dropped them. Non-idempotent requests get no retry, so they only reuse very recent connections
+MAX_IDLE_SECONDS = 60
+MAX_IDLE_SECONDS_UNSAFE = 2
+
+# Errors raised when a pooled connection was silently closed by the server
+_STALE_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionError, BrokenPipeError)
+
+# key -> [(connection, idle since)], most recently used last
+_idle: Dict[Tuple[str, str, int], List[Tuple[http.client.HTTPConnection, float]]] = {}
+_idle_lock = threading.Lock()
+
+
+@lru_cache(maxsize=64)
+def _split(url: str) -> Tuple[str, str, int, str]:
+    """Parse a base URL once into (scheme, host, port, path)"""
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    path = parts.path or "/"
+    if parts.query:
+        path = f"{path}?{parts.query}"
+    return parts.scheme, parts.hostname, port, path
+
+
+def _new_connection(key: Tuple[str, str, int], timeout: float) -> http.client.HTTPConnection:
+    scheme, host, port = key
+    conn_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+    return conn_class(host, port, timeout=timeout)
+
+
+def _checkout(key: Tuple[str, str, int], timeout: float, max_idle: float) -> Tuple[http.client.HTTPConnection, bool]:
+    """Take an idle connection for this host, or open a new one. Returns (conn, reused)"""
+    conn = None
+    with _idle_lock:
+        pool = _idle.get(key, [])
+        now = time.monotonic()
+        # Pool is in check-in order, so expired connections are at the front
+        cut = 0
+        while cut < len(pool) and now - pool[cut][1] > MAX_IDLE_SECONDS:
+            cut += 1
+        expired = [c for c, _ in pool[:cut]]
+        del pool[:cut]
+        if pool and now - pool[-1][1] <= max_idle:
+            conn = pool.pop()[0]
+    for stale in expired:
+        stale.close()
+
+    if conn is None:
+        return _new_connection(key, timeout), False
+    conn.timeout = timeout
+    if conn.sock is not None:
+        conn.sock.settimeout(timeout)
+    return conn, True
+
+
+def _checkin(key: Tuple[str, str, int], conn: http.client.HTTPConnection):
+    """Return a connection to the idle pool (closing it if the pool is full)"""
+    with _idle_lock:
+        pool = _idle.setdefault(key, [])
+        if len(pool) < MAX_IDLE_PER_HOST:
+            pool.append((conn, time.monotonic()))
+            return
+    conn.close()
+
+
+def _send(
+    key: Tuple[str, str, int],
+    method: str,
+    path: str,
+    body: Optional[bytes],
+    headers: dict,
+    timeout: float
+) -> Tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+    """Send one request on a pooled connection, returns (conn, response)"""
+    max_idle = MAX_IDLE_SECONDS if method in _IDEMPOTENT_METHODS else MAX_IDLE_SECONDS_UNSAFE
+    conn, reused = _checkout(key, timeout, max_idle)
+    try:
+        conn.request(method, path, body=body, headers=headers)
+        return conn, conn.getresponse()
+    except _STALE_ERRORS:
+        conn.close()
+        if not reused or method not in _IDEMPOTENT_METHODS:
+            raise
+    except Exception:
+        conn.close()
+        raise
+    
+    # Idle connection was dropped by the server, retry once on a fresh one
+    conn = _new_connection(key, timeout)
+    try:
+        conn.request(method, path, body=body, headers=headers)
+        return conn, conn.getresponse()
+    except Exception:
+        conn.close()
+        raise
+
+
+def _release(key: Tuple[str, str, int], conn: http.client.HTTPConnection, response: http.client.HTTPResponse):
+    """Pool the connection if its response was fully read, otherwise close it"""
+    if response.isclosed() and not response.will_close:
+        _checkin(key, conn)
+    else:
+        conn.close()
+
+
+@contextmanager
+def open_url(
+    method: str,
+    url: str,
+    params: Optional[dict] = None,
+    body: Optional[bytes] = None,
+    headers: Optional[dict] = None,
+    timeout: float = DEFAULT_TIMEOUT
+) -> Iterator[http.client.HTTPResponse]:
+    """
+    Send a request over a pooled keep-alive connection and yield the response.
+
+    Redirects are followed up to MAX_REDIRECTS hops, after which the last 3xx is returned
+    (303, and 301/302 after a POST, switch to a bodiless GET; Authorization is dropped when the
+    host changes). The connection goes back to
+    the pool only if the response body was fully read; otherwise it is closed. Unlike urlopen,
+    non-2xx statuses are not raised - check response.status.
+    """
+    scheme, host, port, path = _split(url)
+    if params:
+        query = urlencode(params)
+        path = f"{path}{'&' if '?' in path else '?'}{query}"
+        url = f"{url}{'&' if '?' in url else '?'}{query}"
+    headers = headers or {}
+
+    for hop in range(MAX_REDIRECTS + 1):
+        key = (scheme, host, port)
+        conn, response = _send(key, method, path, body, headers, timeout)
+
+        location = response.getheader("Location")
+        if response.status not in _REDIRECT_STATUSES or not location or hop == MAX_REDIRECTS:
+            break
+
+        response.read()
+        _release(key, conn, response)
+        if response.status == 303 or (response.status in (301, 302) and method == "POST"):
+            method, body = "GET", None
+        url = urljoin(url, location)
+        previous_host = host
+        scheme, host, port, path = _split(url)
+        if host != previous_host and "Authorization" in headers:
+            headers = {k: v for k, v in headers.items() if k != "Authorization"}
+
+    try:
+        yield response
+    finally:
+        _release(key, conn, response)
+
+
+def request(
+    method: str,
+    url: str,
+    params: Optional[dict] = None,
+    body: Optional[bytes] = None,
+    headers: Optional[dict] = None,
+    timeout: float = DEFAULT_TIMEOUT
+) -> Tuple[int, bytes]:
+    """Send a request over a pooled connection and return (status, body)"""
+    with open_url(method, url, params=params, body=body, headers=headers, timeout=timeout) as response:
+        return response.status, response.read()
@@ -1,4 +1,5 @@
 import os
+import time
 import asyncio
 import math
 from typing import Optional, Callable, BinaryIO
@@ -64,14 +65,28 @@ async def download_media_fast(
         # Even small files benefit from parallel connections
         LOGGER(__name__).info(f"FastTelethon download starting: {file} ({file_size} bytes, optimized connections)")
         
+        connections, adaptive = _download_connection_count(file_size)
+        
         with open(file, 'wb') as f:
+            # Reserve the extent upfront to avoid fragmentation and per-write block allocation
+            # (in a thread: without native fallocate support glibc emulates it by writing every block)
+            preallocated = await asyncio.to_thread(_preallocate, f, file_size)
+            # Timed after preallocation so the throughput sample covers only the download
+            started = time.monotonic()
             await fast_download(
                 client=client,
                 location=media,
                 out=f,
                 progress_callback=progress_callback,
-                file_size=file_size
+                file_size=file_size,
+                connection_count=connections
             )
+            if preallocated:
+                # Drop any reserved tail if fewer bytes arrived than advertised
+                f.truncate(f.tell())
+        
+        if adaptive:
+            _record_throughput(connections, file_size, time.monotonic() - started)
         
         LOGGER(__name__).info(f"FastTelethon download complete: {file}")
         return file
@@ -120,3 +135,55 @@ def _optimized_connection_count(file_size, max_count=MAX_DOWNLOAD_CONNECTIONS, f
     return max(min_connections, math.ceil((file_size / full_size) * max_count))
 
 ParallelTransferrer._get_connection_count = staticmethod(_optimized_connection_count)
+
+# Large downloads (those that would use MAX_DOWNLOAD_CONNECTIONS) pick their connection count
+# from measured throughput: EWMA of bytes/s per count, each candidate tried once before exploiting.
+# More connections cost RAM and don't help on a link that can't fill them.
+# Samples are noisy (concurrent downloads, progress callbacks), so every _TP_EXPLORE_EVERY-th
+# pick re-measures one of the other counts instead of trusting the current best for good.
+_TP_ALPHA = 0.3
+_TP_EXPLORE_EVERY = 8
+_tp_history: dict[int, float] = {}
+_tp_picks = 0
+
+def _adaptive_candidates(max_count=MAX_DOWNLOAD_CONNECTIONS):
+    return sorted({max(4, max_count // 2), (max_count * 3) // 4, max_count})
+
+def _download_connection_count(file_size):
+    """Returns (connection count, whether it was chosen adaptively)"""
+    global _tp_picks
+    heuristic = _optimized_connection_count(file_size)
+    if heuristic < MAX_DOWNLOAD_CONNECTIONS:
+        return heuristic, False
+    
+    candidates = _adaptive_candidates()
+    for candidate in candidates:
+        if candidate not in _tp_history:
+            return candidate, True
+    
+    _tp_picks += 1
+    best = max(candidates, key=_tp_history.get)
+    others = [c for c in candidates if c != best]
+    if others and _tp_picks % _TP_EXPLORE_EVERY == 0:
+        return others[(_tp_picks // _TP_EXPLORE_EVERY) % len(others)], True
+    return best, True
+
+def _record_throughput(connections, file_size, elapsed):
+    if elapsed <= 0:
+        return
+    throughput = file_size / elapsed
+    previous = _tp_history.get(connections)
+    _tp_history[connections] = throughput if previous is None else (1 - _TP_ALPHA) * previous + _TP_ALPHA * throughput
+    LOGGER(__name__).debug(f"Download throughput with {connections} connections: {throughput / 1024 / 1024:.2f} MB/s "
+                           f"(EWMA {_tp_history[connections] / 1024 / 1024:.2f} MB/s)")
+
+def _preallocate(f, file_size):
+    """Reserve file_size bytes on disk for f; returns False where unsupported (non-Linux, tmpfs quirks, etc.)"""
+    if file_size <= 0 or not hasattr(os, 'posix_fallocate'):
+        return False
+    try:
+        os.posix_fallocate(f.fileno(), 0, file_size)
+        return True
+    except OSError as e:
+        LOGGER(__name__).debug(f"posix_fallocate unavailable for {f.name}: {e}")
+        return False
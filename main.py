@@ -172,7 +172,7 @@ async def start(event):
         verification_code = command[1].replace("verify_", "").strip()
         LOGGER(__name__).info(f"🔗 AUTO-VERIFICATION | User: {event.sender_id} ({username}) | Code: {verification_code}")
         
-        success, msg = ad_monetization.verify_code(verification_code, event.sender_id)
+        success, msg = await ad_monetization.verify_code_async(verification_code, event.sender_id)
         
         if success:
             await event.respond(
@@ -1146,7 +1146,7 @@ async def get_premium_command(event):
         
         bot_domain = PyroConf.get_app_url()
         
-        verification_code, ad_url = ad_monetization.generate_droplink_ad_link(event.sender_id, bot_domain)
+        verification_code, ad_url = await ad_monetization.generate_droplink_ad_link_async(event.sender_id, bot_domain)
         
         premium_text = (
             f"🎬 **Get {PREMIUM_DOWNLOADS} FREE downloads!**\n\n"
@@ -1188,7 +1188,7 @@ async def verify_premium_command(event):
         
         verification_code = command[1].strip()
         
-        success, msg = ad_monetization.verify_code(verification_code, event.sender_id)
+        success, msg = await ad_monetization.verify_code_async(verification_code, event.sender_id)
         
         if success:
             await event.respond(msg)
@@ -1316,7 +1316,7 @@ async def callback_handler(event):
             return
         
         bot_domain = PyroConf.get_app_url()
-        verification_code, ad_url = ad_monetization.generate_droplink_ad_link(user_id, bot_domain)
+        verification_code, ad_url = await ad_monetization.generate_droplink_ad_link_async(user_id, bot_domain)
         
         premium_text = (
             f"🎬 **Get {PREMIUM_DOWNLOADS} FREE downloads!**\n\n"
@@ -1416,7 +1416,7 @@ async def callback_handler(event):
             return
         
         bot_domain = PyroConf.get_app_url()
-        verification_code, ad_url = ad_monetization.generate_droplink_ad_link(user_id, bot_domain)
+        verification_code, ad_url = await ad_monetization.generate_droplink_ad_link_async(user_id, bot_domain)
         
         premium_text = (
             f"🎬 **Get {PREMIUM_DOWNLOADS} FREE downloads!**\n\n"